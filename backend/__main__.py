@@ -0,0 +1,26 @@
+"""Run the API with `python -m backend` from the repository root"""
+import os
+import sys
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+if __name__ == "__main__":
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+
+    # Hand uvicorn an import string so only the server processes import app
+    # (and load ChromaDB and the embedder); this launcher never does
+    uvicorn.run(
+        "app:app",
+        app_dir=BACKEND_DIR,
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        # uvloop (no Windows support) and httptools for high-concurrency I/O
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools"
+    )
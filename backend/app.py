@@ -1,4 +1,5 @@
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load .env file FIRST before importing anything else
@@ -9,21 +10,26 @@ print(f"🔑 API Key loaded: {os.getenv('GROQ_API_KEY', 'NOT FOUND')[:20]}...")
 
 import json
 import io
+import asyncio
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, BinaryIO
+import orjson
 import uvicorn
 
 # Import file processing libraries
-from PyPDF2 import PdfReader
+from pypdf import PdfReader
 from docx import Document
+from charset_normalizer import from_bytes
 
 from llm_handler import LLMHandler
+from llm_cache import SemanticLLMCache
 from document_processor import DocumentProcessor
 from memory_manager import MemoryManager
 
-app = FastAPI(title="Document Intelligence System")
+app = FastAPI(title="Document Intelligence System", default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -35,9 +41,24 @@ app.add_middleware(
 )
 
 # Initialize components
-llm_handler = LLMHandler()
-doc_processor = DocumentProcessor(llm_handler)
 memory_manager = MemoryManager()
+llm_cache = SemanticLLMCache(
+    memory_manager.client,
+    memory_manager.embedder,
+    threshold=float(os.getenv("LLM_CACHE_THRESHOLD", "0.95"))
+)
+llm_handler = LLMHandler(cache=llm_cache)
+doc_processor = DocumentProcessor(llm_handler)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled LLM connections"""
+    await llm_handler.aclose()
+
+
+# Largest accepted upload, in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
 
 
 class ProcessRequest(BaseModel):
@@ -51,23 +72,19 @@ class QueryRequest(BaseModel):
     provider: str = "groq"
 
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+def extract_text_from_pdf(pdf_file: BinaryIO) -> str:
     """Extract text from PDF file"""
     try:
-        pdf_file = io.BytesIO(file_content)
         reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        pages = [page.extract_text() or "" for page in reader.pages]
+        return "\n".join(pages).strip()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
 
 
-def extract_text_from_docx(file_content: bytes) -> str:
+def extract_text_from_docx(docx_file: BinaryIO) -> str:
     """Extract text from DOCX file"""
     try:
-        docx_file = io.BytesIO(file_content)
         doc = Document(docx_file)
         text = ""
         for paragraph in doc.paragraphs:
@@ -82,10 +99,21 @@ def extract_text_from_txt(file_content: bytes) -> str:
     try:
         return file_content.decode('utf-8').strip()
     except UnicodeDecodeError:
-        try:
-            return file_content.decode('latin-1').strip()
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error reading TXT: {str(e)}")
+        # Not UTF-8: detect the encoding and decode in one go
+        best = from_bytes(file_content).best()
+        if best is None:
+            raise HTTPException(status_code=400, detail="Error reading TXT: could not detect text encoding")
+        return str(best).strip()
+
+
+def get_upload_size(file: UploadFile) -> int:
+    """Get upload size in bytes without reading it into memory"""
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, io.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
 
 
 @app.post("/api/upload-document")
@@ -96,18 +124,24 @@ async def upload_document(
 ):
     """Upload and process a document file (PDF, DOCX, TXT)"""
     try:
-        # Read file content
-        file_content = await file.read()
+        if get_upload_size(file) > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+            )
 
         # Extract text based on file type
         filename = file.filename.lower()
 
+        # Parsers read straight from the spooled upload; parsing is blocking
+        # CPU work, so run it off the event loop
         if filename.endswith('.pdf'):
-            text = extract_text_from_pdf(file_content)
+            text = await asyncio.to_thread(extract_text_from_pdf, file.file)
         elif filename.endswith('.docx'):
-            text = extract_text_from_docx(file_content)
+            text = await asyncio.to_thread(extract_text_from_docx, file.file)
         elif filename.endswith('.txt'):
-            text = extract_text_from_txt(file_content)
+            file_content = await file.read()
+            text = await asyncio.to_thread(extract_text_from_txt, file_content)
         else:
             raise HTTPException(
                 status_code=400,
@@ -121,13 +155,15 @@ async def upload_document(
             )
 
         # Process through the pipeline (same as text input)
-        summary = await doc_processor.summarize(text, provider)
-        facts = await doc_processor.extract_facts(text, summary, provider)
-        questions = await doc_processor.generate_questions(text, summary, facts, provider)
+        summary, partials = await doc_processor.summarize_with_partials(text, provider)
+        facts, questions = await asyncio.gather(
+            doc_processor.extract_facts(text, summary, provider, partials=partials),
+            doc_processor.generate_questions(text, summary, provider)
+        )
 
         # Store in memory if enabled
         if use_memory:
-            memory_manager.store_document(
+            await memory_manager.astore_document(
                 text=text,
                 summary=summary,
                 facts=facts,
@@ -154,19 +190,21 @@ async def process_document(request: ProcessRequest):
     """Process document through the 3-step pipeline"""
     try:
         # Step 1: Summarize
-        summary = await doc_processor.summarize(request.text, request.provider)
-        
-        # Step 2: Extract Facts
-        facts = await doc_processor.extract_facts(request.text, summary, request.provider)
+        summary, partials = await doc_processor.summarize_with_partials(
+            request.text, request.provider
+        )
         
-        # Step 3: Generate Questions
-        questions = await doc_processor.generate_questions(
-            request.text, summary, facts, request.provider
+        # Steps 2 & 3: Extract Facts and Generate Questions concurrently
+        facts, questions = await asyncio.gather(
+            doc_processor.extract_facts(
+                request.text, summary, request.provider, partials=partials
+            ),
+            doc_processor.generate_questions(request.text, summary, request.provider)
         )
         
         # Store in memory if enabled
         if request.use_memory:
-            memory_manager.store_document(
+            await memory_manager.astore_document(
                 text=request.text,
                 summary=summary,
                 facts=facts,
@@ -183,11 +221,63 @@ async def process_document(request: ProcessRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def sse_event(event: str, data) -> bytes:
+    """Format a server-sent event with a JSON payload"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@app.post("/api/process-document/stream")
+async def process_document_stream(request: ProcessRequest):
+    """Process document through the 3-step pipeline, streaming the summary as it is generated
+
+    Emits `summary` events with text deltas, then `facts`, `questions` and `done`
+    (or `error` if the pipeline fails part-way).
+    """
+    async def events():
+        try:
+            # Step 1: Summarize, forwarding tokens as they arrive
+            prompt, partials = await doc_processor.build_summary_prompt(
+                request.text, request.provider
+            )
+            parts = []
+            async for token in llm_handler.generate_stream(
+                prompt, provider=request.provider, temperature=0.3, exact_cache_only=True
+            ):
+                parts.append(token)
+                yield sse_event("summary", token)
+            summary = "".join(parts)
+            
+            # Steps 2 & 3: Extract Facts and Generate Questions concurrently
+            facts, questions = await asyncio.gather(
+                doc_processor.extract_facts(
+                    request.text, summary, request.provider, partials=partials
+                ),
+                doc_processor.generate_questions(request.text, summary, request.provider)
+            )
+            yield sse_event("facts", facts)
+            yield sse_event("questions", questions)
+            
+            # Store in memory if enabled
+            if request.use_memory:
+                await memory_manager.astore_document(
+                    text=request.text,
+                    summary=summary,
+                    facts=facts,
+                    questions=questions
+                )
+            
+            yield sse_event("done", {"success": True})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.post("/api/query-memory")
 async def query_memory(request: QueryRequest):
     """Query the memory system"""
     try:
-        results = memory_manager.query(request.query, top_k=5)
+        results = await memory_manager.aquery(request.query, top_k=5)
         
         # Generate answer using retrieved context
         context = "\n\n".join([r["text"] for r in results])
@@ -200,7 +290,10 @@ Context:
 Question: {request.query}
 
 Answer:""",
-            provider=request.provider
+            provider=request.provider,
+            # The question follows the retrieved context, so prompts for different
+            # questions can look alike; always ask the provider
+            no_cache=True
         )
         
         return {
@@ -215,13 +308,15 @@ Answer:""",
 @app.get("/api/memory-stats")
 async def get_memory_stats():
     """Get memory system statistics"""
-    return memory_manager.get_stats()
+    return await memory_manager.aget_stats()
 
 
 @app.delete("/api/memory")
 async def clear_memory():
     """Clear all memory"""
-    memory_manager.clear()
+    await memory_manager.aclear()
+    # Cached prompts and completions contain document text too
+    await asyncio.to_thread(llm_cache.clear)
     return {"success": True, "message": "Memory cleared"}
 
 
@@ -232,4 +327,12 @@ async def get_providers():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Serves this already-initialized module in one process; use
+    # `python -m backend` to run multiple workers without loading it twice
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools"
+    )
@@ -1,16 +1,24 @@
-from typing import List
+import asyncio
+import re
+from typing import List, Optional, Tuple
 from llm_handler import LLMHandler
 
 
-class DocumentProcessor:
-    """Processes documents through the 3-step pipeline"""
-    
-    def __init__(self, llm_handler: LLMHandler):
-        self.llm = llm_handler
-    
-    async def summarize(self, text: str, provider: str = "groq") -> str:
-        """Step 1: Summarize the document"""
-        prompt = f"""Summarize the following document concisely. 
+# Bulleted ("-", "•", "*") or numbered ("1." / "1)") list items
+# (the item must start with a non-marker character, so rules like "---" are skipped)
+_FACT_RE = re.compile(r'(?m)^[ \t]*(?:[-•*][-•* \t]*(?=[^-•*\s])|\d+[.)][ \t]*)(\S.*?)[ \t\r]*$')
+
+# "Q:"/"Question:" lines, "Type:" lines, and bare lines containing a question mark
+_QUESTION_RE = re.compile(
+    r'(?m)^[ \t]*(?:'
+    r'(?:Q|Question):[ \t]*(?P<question>.*?)'
+    r'|Type:[ \t]*(?P<type>.*?)'
+    r'|(?P<loose>\S.*\?.*?)'
+    r')[ \t\r]*$'
+)
+
+# Prompt templates; only the document-specific slots are filled per call
+SUMMARIZE_TMPL = """Summarize the following document concisely. 
 Focus on the main ideas, key points, and important details.
 Keep the summary clear and informative.
 
@@ -18,86 +26,187 @@ Document:
 {text}
 
 Summary:"""
-        
-        return await self.llm.generate(prompt, provider=provider, temperature=0.3)
-    
-    async def extract_facts(
-        self, text: str, summary: str, provider: str = "groq"
-    ) -> List[str]:
-        """Step 2: Extract key facts from the document"""
-        prompt = f"""Based on the document and its summary, extract the most important facts.
+
+SUMMARIZE_SECTION_TMPL = """Summarize the following section of a longer document concisely.
+Focus on the main ideas, key points, and important details.
+
+Section:
+{chunk}
+
+Summary:"""
+
+COMBINE_SUMMARIES_TMPL = """The following are summaries of consecutive sections of one document.
+Combine them into a single concise summary of the whole document.
+Focus on the main ideas, key points, and important details.
+
+Section Summaries:
+{sections}
+
+Summary:"""
+
+EXTRACT_FACTS_TMPL = """Based on the document and its summary, extract the most important facts.
 List each fact as a separate bullet point. Be specific and factual.
 
-Document:
-{text}
+{label}:
+{document}
 
 Summary:
 {summary}
 
 Extract 5-10 key facts in bullet point format:"""
-        
-        response = await self.llm.generate(prompt, provider=provider, temperature=0.3)
-        
-        # Parse bullet points
-        facts = []
-        for line in response.split('\n'):
-            line = line.strip()
-            if line and (line.startswith('-') or line.startswith('•') or line.startswith('*')):
-                fact = line.lstrip('-•* ').strip()
-                if fact:
-                    facts.append(fact)
-            elif line and not any(line.startswith(x) for x in ['Extract', 'Facts', 'Key']):
-                # Handle numbered lists
-                import re
-                match = re.match(r'^\d+[\.)]\s*(.+)$', line)
-                if match:
-                    facts.append(match.group(1).strip())
-        
-        return facts if facts else [response]  # Fallback to full response
-    
-    async def generate_questions(
-        self, text: str, summary: str, facts: List[str], provider: str = "groq"
-    ) -> List[dict]:
-        """Step 3: Generate questions based on the document"""
-        facts_text = '\n'.join([f"- {fact}" for fact in facts])
-        
-        prompt = f"""Based on the document, summary, and extracted facts, generate 5-7 insightful questions 
+
+GENERATE_QUESTIONS_TMPL = """Based on the document summary, generate 5-7 insightful questions 
 that test understanding of the content. Include both factual and analytical questions.
 
 Document Summary:
 {summary}
 
-Key Facts:
-{facts_text}
-
 Generate questions in the following format:
 Q: [Question]
 Type: [factual/analytical/inference]
 
 Questions:"""
+
+# Documents longer than this (in characters) are summarized chunk by chunk
+CHUNK_THRESHOLD_CHARS = 12000
+
+
+def _chunk(text: str, target_tokens: int = 2000, overlap: int = 200) -> List[str]:
+    """Split text into overlapping chunks of roughly target_tokens (~4 chars per token)"""
+    size = target_tokens * 4
+    step_back = overlap * 4
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Prefer to cut on a paragraph or word boundary in the second half
+            cut = text.rfind("\n\n", start + size // 2, end)
+            if cut == -1:
+                cut = text.rfind(" ", start + size // 2, end)
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - step_back, start + 1)
+    return [chunk for chunk in chunks if chunk]
+
+
+class DocumentProcessor:
+    """Processes documents through the 3-step pipeline
+
+    Pipeline prompts are a fixed template around the document, so near-identical
+    prompts can belong to different documents; they only reuse exact-match cache hits.
+    """
+    
+    def __init__(self, llm_handler: LLMHandler):
+        self.llm = llm_handler
+    
+    async def summarize(self, text: str, provider: str = "groq") -> str:
+        """Step 1: Summarize the document"""
+        summary, _ = await self.summarize_with_partials(text, provider)
+        return summary
+    
+    async def summarize_with_partials(
+        self, text: str, provider: str = "groq"
+    ) -> Tuple[str, List[str]]:
+        """Step 1: Summarize the document, also returning per-chunk summaries"""
+        prompt, partials = await self.build_summary_prompt(text, provider)
+        summary = await self.llm.generate(
+            prompt, provider=provider, temperature=0.3, exact_cache_only=True
+        )
+        return summary, partials
+    
+    async def build_summary_prompt(
+        self, text: str, provider: str = "groq"
+    ) -> Tuple[str, List[str]]:
+        """Build the final summarization prompt and any per-chunk summaries
+
+        Long documents are split into chunks that are summarized concurrently and
+        then combined; partials is empty when the document fits in one prompt.
+        """
+        if len(text) <= CHUNK_THRESHOLD_CHARS:
+            return SUMMARIZE_TMPL.format_map({"text": text}), []
+        
+        partials = await asyncio.gather(*[
+            self.llm.generate(
+                SUMMARIZE_SECTION_TMPL.format_map({"chunk": chunk}),
+                provider=provider,
+                temperature=0.3,
+                exact_cache_only=True
+            )
+            for chunk in _chunk(text)
+        ])
+        
+        sections = "\n\n".join(partials)
+        return COMBINE_SUMMARIES_TMPL.format_map({"sections": sections}), list(partials)
+    
+    async def extract_facts(
+        self,
+        text: str,
+        summary: str,
+        provider: str = "groq",
+        partials: Optional[List[str]] = None
+    ) -> List[str]:
+        """Step 2: Extract key facts from the document
+
+        When section summaries are given they stand in for the full document text.
+        """
+        if partials:
+            document = "\n\n".join(partials)
+            label = "Section Summaries"
+        else:
+            document = text
+            label = "Document"
+        
+        prompt = EXTRACT_FACTS_TMPL.format_map({
+            "label": label,
+            "document": document,
+            "summary": summary
+        })
+        
+        response = await self.llm.generate(
+            prompt, provider=provider, temperature=0.3, exact_cache_only=True
+        )
+        
+        # Parse bullet points and numbered items
+        facts = [match.group(1) for match in _FACT_RE.finditer(response)]
+        
+        return facts if facts else [response]  # Fallback to full response
+    
+    async def generate_questions(
+        self, text: str, summary: str, provider: str = "groq"
+    ) -> List[dict]:
+        """Step 3: Generate questions based on the document summary
+
+        Only depends on the summary, so it can run concurrently with extract_facts.
+        """
+        prompt = GENERATE_QUESTIONS_TMPL.format_map({"summary": summary})
         
-        response = await self.llm.generate(prompt, provider=provider, temperature=0.5)
+        response = await self.llm.generate(
+            prompt, provider=provider, temperature=0.5, exact_cache_only=True
+        )
         
         # Parse questions
         questions = []
         current_q = None
         current_type = None
         
-        for line in response.split('\n'):
-            line = line.strip()
-            if line.startswith('Q:') or line.startswith('Question:'):
+        for match in _QUESTION_RE.finditer(response):
+            if match.group('question') is not None:
                 if current_q:
                     questions.append({
                         "question": current_q,
                         "type": current_type or "general"
                     })
-                current_q = line.split(':', 1)[1].strip()
+                current_q = match.group('question')
                 current_type = None
-            elif line.startswith('Type:'):
-                current_type = line.split(':', 1)[1].strip().lower()
-            elif line and current_q is None and '?' in line:
+            elif match.group('type') is not None:
+                current_type = match.group('type').lower()
+            elif current_q is None:
                 # Handle questions without Q: prefix
-                current_q = line
+                current_q = match.group('loose')
         
         # Add the last question
         if current_q:
@@ -0,0 +1,181 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+# Seconds a cached completion stays valid, per provider
+DEFAULT_TTLS = {
+    "groq": 24 * 3600,
+    "openai": 24 * 3600,
+    "anthropic": 24 * 3600,
+    "ollama": 3600  # local models get swapped out more often
+}
+
+# The embedder truncates at 256 tokens; longer prompts would only be compared
+# on their opening, so they get exact matching only (~3 chars per token, conservatively)
+DEFAULT_MAX_SEMANTIC_CHARS = 768
+
+
+class SemanticLLMCache:
+    """Caches LLM completions by exact prompt match, then by prompt similarity"""
+
+    def __init__(
+        self,
+        client,
+        embedding_function,
+        threshold: float = 0.95,
+        ttls: Optional[Dict[str, int]] = None,
+        max_exact_entries: int = 1024,
+        max_semantic_chars: int = DEFAULT_MAX_SEMANTIC_CHARS
+    ):
+        """Use a dedicated collection on an existing ChromaDB client and embedder"""
+        self.client = client
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_exact_entries = max_exact_entries
+        self.max_semantic_chars = max_semantic_chars
+        self._exact = OrderedDict()
+        # get/set run in worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+        self.collection = self._get_collection()
+
+    def _get_collection(self):
+        # Cosine space so that 1 - distance is the cosine similarity
+        return self.client.get_or_create_collection(
+            name="llm_prompt_cache",
+            metadata={
+                "description": "Caches LLM completions keyed by prompt",
+                "hnsw:space": "cosine"
+            },
+            embedding_function=self.embedding_function
+        )
+
+    @staticmethod
+    def _key(provider: str, model: str, temperature: float, prompt: str) -> str:
+        raw = f"{provider}\x00{model}\x00{round(temperature, 1)}\x00{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, provider: str, ts: float) -> bool:
+        ttl = self.ttls.get(provider)
+        return ttl is not None and time.time() - ts > ttl
+
+    def _remember(self, key: str, ts: float, completion: str):
+        with self._lock:
+            self._exact[key] = (ts, completion)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_exact_entries:
+                self._exact.popitem(last=False)
+
+    def get(
+        self,
+        provider: str,
+        model: str,
+        temperature: float,
+        prompt: str,
+        semantic: bool = True
+    ) -> Optional[str]:
+        """Return a cached completion, or None on miss
+
+        With semantic=False only an exact prompt match counts.
+        """
+        key = self._key(provider, model, temperature, prompt)
+
+        # L1: exact match in process
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None:
+                ts, completion = entry
+                if not self._expired(provider, ts):
+                    self._exact.move_to_end(key)
+                    return completion
+                del self._exact[key]
+
+        # L2: nearest cached prompt for the same provider/model/temperature,
+        # only for prompts the embedder sees in full
+        if (
+            not semantic
+            or len(prompt) > self.max_semantic_chars
+            or self.collection.count() == 0
+        ):
+            return None
+
+        results = self.collection.query(
+            query_texts=[prompt],
+            n_results=1,
+            where={
+                "$and": [
+                    {"provider": provider},
+                    {"model": model},
+                    {"temperature": round(temperature, 1)}
+                ]
+            }
+        )
+
+        if not results["ids"] or not results["ids"][0]:
+            return None
+
+        metadata = results["metadatas"][0][0]
+        distance = results["distances"][0][0]
+        if self._expired(provider, metadata["ts"]):
+            self.collection.delete(ids=[results["ids"][0][0]])
+            return None
+        if 1 - distance < self.threshold:
+            return None
+
+        # Not promoted to the exact tier: this prompt never actually produced it
+        return metadata["completion"]
+
+    def set(
+        self,
+        provider: str,
+        model: str,
+        temperature: float,
+        prompt: str,
+        completion: str,
+        semantic: bool = True
+    ):
+        """Store a completion for a prompt
+
+        With semantic=False it is kept for exact matches only.
+        """
+        key = self._key(provider, model, temperature, prompt)
+        ts = time.time()
+        self._remember(key, ts, completion)
+        self._prune(provider, ts)
+        if not semantic or len(prompt) > self.max_semantic_chars:
+            return
+        self.collection.upsert(
+            documents=[prompt],
+            metadatas=[{
+                "provider": provider,
+                "model": model,
+                "temperature": round(temperature, 1),
+                "ts": ts,
+                "completion": completion
+            }],
+            ids=[key]
+        )
+
+    def _prune(self, provider: str, now: float):
+        """Delete this provider's expired rows so the collection doesn't grow unbounded"""
+        ttl = self.ttls.get(provider)
+        if ttl is None:
+            return
+        self.collection.delete(
+            where={
+                "$and": [
+                    {"provider": provider},
+                    {"ts": {"$lt": now - ttl}}
+                ]
+            }
+        )
+
+    def clear(self):
+        """Drop all cached completions"""
+        with self._lock:
+            self._exact.clear()
+        self.client.delete_collection(name="llm_prompt_cache")
+        self.collection = self._get_collection()
@@ -1,13 +1,17 @@
 import os
+import json
 import asyncio
-from typing import Optional
+from typing import AsyncIterator, Optional
 import httpx
 
+from llm_cache import SemanticLLMCache
+
 
 class LLMHandler:
     """Handler for multiple LLM providers"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[SemanticLLMCache] = None):
+        self.cache = cache
         self.providers = {
             "groq": {
                 "api_key": os.getenv("GROQ_API_KEY"),
@@ -30,29 +34,121 @@ class LLMHandler:
                 "model": "llama3.2"  # or any installed model
             }
         }
+        
+        # Environment is fixed for the process lifetime, so this never changes
+        self._available = {
+            name: {
+                # Ollama needs no API key
+                "configured": True if name == "ollama" else bool(config["api_key"]),
+                "model": config["model"]
+            }
+            for name, config in self.providers.items()
+        }
+
+        # Shared client so connections (and TLS sessions) are reused across calls
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=64,
+                max_keepalive_connections=32,
+                keepalive_expiry=30.0
+            ),
+            http2=True
+        )
+
+        # Cap in-flight provider requests process-wide to stay under rate limits
+        self._sem = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "16")))
     
     async def generate(
         self, 
         prompt: str, 
         provider: str = "groq",
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        no_cache: bool = False,
+        exact_cache_only: bool = False
     ) -> str:
-        """Generate text using specified provider"""
+        """Generate text using specified provider
+
+        exact_cache_only skips prompt-similarity matching, for prompts where a small
+        difference (a name, a number) must change the answer.
+        """
         
         if provider not in self.providers:
             raise ValueError(f"Unknown provider: {provider}")
         
         config = self.providers[provider]
+        use_cache = self.cache is not None and not no_cache
+        
+        if use_cache:
+            # ChromaDB embeds the prompt synchronously, keep it off the event loop
+            cached = await asyncio.to_thread(
+                self.cache.get, provider, config["model"], temperature, prompt,
+                not exact_cache_only
+            )
+            if cached is not None:
+                return cached
         
         if provider == "ollama":
-            return await self._generate_ollama(prompt, config, temperature)
+            result = await self._generate_ollama(prompt, config, temperature)
         elif provider == "anthropic":
-            return await self._generate_anthropic(prompt, config, temperature, max_tokens)
+            result = await self._generate_anthropic(prompt, config, temperature, max_tokens)
         else:  # OpenAI-compatible (groq, openai)
-            return await self._generate_openai_compatible(
+            result = await self._generate_openai_compatible(
                 prompt, config, temperature, max_tokens
             )
+        
+        if use_cache:
+            await asyncio.to_thread(
+                self.cache.set, provider, config["model"], temperature, prompt, result,
+                not exact_cache_only
+            )
+        
+        return result
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        provider: str = "groq",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        no_cache: bool = False,
+        exact_cache_only: bool = False
+    ) -> AsyncIterator[str]:
+        """Generate text using specified provider, yielding it as it arrives"""
+        
+        if provider not in self.providers:
+            raise ValueError(f"Unknown provider: {provider}")
+        
+        config = self.providers[provider]
+        use_cache = self.cache is not None and not no_cache
+        
+        if use_cache:
+            cached = await asyncio.to_thread(
+                self.cache.get, provider, config["model"], temperature, prompt,
+                not exact_cache_only
+            )
+            if cached is not None:
+                yield cached
+                return
+        
+        if provider == "ollama":
+            stream = self._stream_ollama(prompt, config, temperature)
+        elif provider == "anthropic":
+            stream = self._stream_anthropic(prompt, config, temperature, max_tokens)
+        else:  # OpenAI-compatible (groq, openai)
+            stream = self._stream_openai_compatible(prompt, config, temperature, max_tokens)
+        
+        parts = []
+        async for token in self._buffered(stream):
+            parts.append(token)
+            yield token
+        
+        if use_cache:
+            await asyncio.to_thread(
+                self.cache.set, provider, config["model"], temperature, prompt, "".join(parts),
+                not exact_cache_only
+            )
     
     async def _generate_openai_compatible(
         self, prompt: str, config: dict, temperature: float, max_tokens: int
@@ -72,15 +168,15 @@ class LLMHandler:
             "max_tokens": max_tokens
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
+        async with self._sem:
+            response = await self._client.post(
                 config["endpoint"],
                 headers=headers,
                 json=data
             )
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        response.raise_for_status()
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
     
     async def _generate_anthropic(
         self, prompt: str, config: dict, temperature: float, max_tokens: int
@@ -101,15 +197,15 @@ class LLMHandler:
             "temperature": temperature
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
+        async with self._sem:
+            response = await self._client.post(
                 config["endpoint"],
                 headers=headers,
                 json=data
             )
-            response.raise_for_status()
-            result = response.json()
-            return result["content"][0]["text"]
+        response.raise_for_status()
+        result = response.json()
+        return result["content"][0]["text"]
     
     async def _generate_ollama(
         self, prompt: str, config: dict, temperature: float
@@ -125,26 +221,158 @@ class LLMHandler:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
+            async with self._sem:
+                response = await self._client.post(
                     config["endpoint"],
                     json=data
                 )
+            response.raise_for_status()
+            result = response.json()
+            return result["response"]
+        except Exception as e:
+            raise Exception(f"Ollama error (make sure Ollama is running): {str(e)}")
+    
+    async def _buffered(self, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Read a provider stream in its own task and yield tokens from a buffer
+
+        The task holds the concurrency slot only while the provider is sending, so a
+        slow or stalled consumer never keeps a slot busy.
+        """
+        queue = asyncio.Queue()
+        done = object()
+        
+        async def produce():
+            try:
+                async with self._sem:
+                    async for token in stream:
+                        queue.put_nowait(token)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(done)
+        
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            task.cancel()
+    
+    async def _stream_openai_compatible(
+        self, prompt: str, config: dict, temperature: float, max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Stream using OpenAI-compatible API (server-sent events)"""
+        headers = {
+            "Authorization": f"Bearer {config['api_key']}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "model": config["model"],
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        
+        async with self._client.stream(
+            "POST", config["endpoint"], headers=headers, json=data
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if "error" in chunk:
+                    raise Exception(f"Stream error: {chunk['error']}")
+                if not chunk.get("choices"):
+                    continue
+                content = chunk["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
+    
+    async def _stream_anthropic(
+        self, prompt: str, config: dict, temperature: float, max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Stream using Anthropic API (server-sent events)"""
+        headers = {
+            "x-api-key": config["api_key"],
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+        
+        data = {
+            "model": config["model"],
+            "max_tokens": max_tokens,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "stream": True
+        }
+        
+        async with self._client.stream(
+            "POST", config["endpoint"], headers=headers, json=data
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):].strip())
+                if event.get("type") == "content_block_delta":
+                    text = event["delta"].get("text")
+                    if text:
+                        yield text
+                elif event.get("type") == "message_stop":
+                    break
+                elif event.get("type") == "error":
+                    raise Exception(f"Anthropic stream error: {event['error'].get('message')}")
+    
+    async def _stream_ollama(
+        self, prompt: str, config: dict, temperature: float
+    ) -> AsyncIterator[str]:
+        """Stream using Ollama local API (newline-delimited JSON)"""
+        data = {
+            "model": config["model"],
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": temperature
+            }
+        }
+        
+        try:
+            async with self._client.stream(
+                "POST", config["endpoint"], json=data
+            ) as response:
                 response.raise_for_status()
-                result = response.json()
-                return result["response"]
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise Exception(chunk["error"])
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
         except Exception as e:
             raise Exception(f"Ollama error (make sure Ollama is running): {str(e)}")
     
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._client.aclose()
+    
     def get_available_providers(self) -> dict:
         """Get list of configured providers"""
-        available = {}
-        for name, config in self.providers.items():
-            if name == "ollama":
-                available[name] = {"configured": True, "model": config["model"]}
-            else:
-                available[name] = {
-                    "configured": bool(config["api_key"]),
-                    "model": config["model"]
-                }
-        return available
+        return self._available
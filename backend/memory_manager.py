@@ -1,26 +1,75 @@
+import asyncio
+import os
+import threading
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict
+from chromadb.utils import embedding_functions
+from typing import List, Dict, Tuple
 import uuid
-import json
+import orjson
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime
 
 
+# Resolved against this file, not the working directory, so `python app.py` and
+# `python -m backend` share the same store
+DEFAULT_PERSIST_DIRECTORY = os.getenv(
+    "CHROMA_PERSIST_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_db")
+)
+
+# Cosine space (so relevance = 1 - distance) and a denser HNSW graph for recall at scale
+COLLECTION_METADATA = {
+    "description": "Stores processed documents with embeddings",
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 128
+}
+
+
 class MemoryManager:
     """Manages document memory using ChromaDB vector database"""
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    def __init__(
+        self,
+        persist_directory: str = DEFAULT_PERSIST_DIRECTORY,
+        query_cache_size: int = 1024
+    ):
         """Initialize ChromaDB client"""
-        self.client = chromadb.Client(Settings(
-            persist_directory=persist_directory,
-            anonymized_telemetry=False
-        ))
+        # PersistentClient writes to disk, so stored documents survive restarts
+        # without being re-embedded
+        self.client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        
+        # Embed explicitly (Chroma's bundled all-MiniLM-L6-v2) so writes are batched
+        # and query embeddings can be cached
+        self.embedder = embedding_functions.DefaultEmbeddingFunction()
+        self._embed_query = lru_cache(maxsize=query_cache_size)(self._embed_one)
         
         # Create or get collection
         self.collection = self.client.get_or_create_collection(
             name="document_memory",
-            metadata={"description": "Stores processed documents with embeddings"}
+            metadata=COLLECTION_METADATA,
+            embedding_function=None
         )
+        
+        # Parsed facts/questions per document id, so queries skip JSON decoding.
+        # Metadata keeps the JSON copy for entries written by earlier processes.
+        self._sidecar: Dict[str, Dict] = {}
+        
+        # LRU of formatted query results keyed by (query_text, top_k).
+        # Any write to the collection invalidates it.
+        self._query_cache = OrderedDict()
+        self._query_cache_size = query_cache_size
+        # Bumped on every write, so a query that searched before the write
+        # does not put its (now stale) results back into the cache
+        self._query_generation = 0
+        # Methods run in worker threads via the async wrappers below
+        self._cache_lock = threading.Lock()
     
     def store_document(
         self,
@@ -36,36 +85,68 @@ class MemoryManager:
         metadata = {
             "timestamp": datetime.now().isoformat(),
             "summary": summary,
-            "facts": json.dumps(facts),
-            "questions": json.dumps(questions),
+            "facts": orjson.dumps(facts).decode(),
+            "questions": orjson.dumps(questions).decode(),
             "doc_length": len(text)
         }
         
-        # Store document with embedding
+        # Store document and its summary (for better retrieval) in one batch
         self.collection.add(
-            documents=[text],
-            metadatas=[metadata],
-            ids=[doc_id]
+            embeddings=self._embed([text, summary]),
+            documents=[text, summary],
+            metadatas=[
+                metadata,
+                {
+                    **metadata,
+                    "type": "summary",
+                    "parent_id": doc_id
+                }
+            ],
+            ids=[doc_id, f"{doc_id}_summary"]
         )
         
-        # Also store summary separately for better retrieval
-        summary_id = f"{doc_id}_summary"
-        self.collection.add(
-            documents=[summary],
-            metadatas={
-                **metadata,
-                "type": "summary",
-                "parent_id": doc_id
-            },
-            ids=[summary_id]
-        )
+        self._sidecar[doc_id] = {"facts": facts, "questions": questions}
+        self._invalidate_queries()
         
         return doc_id
     
+    def _invalidate_queries(self):
+        """Drop cached query results; call after the collection has been written"""
+        with self._cache_lock:
+            self._query_generation += 1
+            self._query_cache.clear()
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts"""
+        return [list(embedding) for embedding in self.embedder(texts)]
+    
+    def _embed_one(self, text: str) -> Tuple[float, ...]:
+        """Embed a single text; wrapped by the _embed_query LRU"""
+        return tuple(self._embed([text])[0])
+    
+    def _parsed(self, doc_id: str, metadata: Dict) -> Dict:
+        """Get parsed facts/questions for a document, decoding metadata only once"""
+        parsed = self._sidecar.get(doc_id)
+        if parsed is None:
+            parsed = {
+                "facts": orjson.loads(metadata.get("facts", "[]")),
+                "questions": orjson.loads(metadata.get("questions", "[]"))
+            }
+            self._sidecar[doc_id] = parsed
+        return parsed
+    
     def query(self, query_text: str, top_k: int = 5) -> List[Dict]:
         """Query the memory for relevant documents"""
+        key = (query_text, top_k)
+        with self._cache_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                return list(cached)
+            generation = self._query_generation
+        
         results = self.collection.query(
-            query_texts=[query_text],
+            query_embeddings=[list(self._embed_query(query_text))],
             n_results=top_k
         )
         
@@ -75,17 +156,47 @@ class MemoryManager:
             for i, doc in enumerate(results['documents'][0]):
                 metadata = results['metadatas'][0][i]
                 distance = results['distances'][0][i] if results['distances'] else None
+                doc_id = metadata.get("parent_id") or results['ids'][0][i]
+                parsed = self._parsed(doc_id, metadata)
                 
                 formatted_results.append({
                     "text": doc,
                     "summary": metadata.get("summary", ""),
-                    "facts": json.loads(metadata.get("facts", "[]")),
-                    "questions": json.loads(metadata.get("questions", "[]")),
+                    "facts": parsed["facts"],
+                    "questions": parsed["questions"],
                     "timestamp": metadata.get("timestamp", ""),
                     "relevance_score": 1 - distance if distance else None
                 })
         
-        return formatted_results
+        with self._cache_lock:
+            if generation == self._query_generation:
+                self._query_cache[key] = formatted_results
+                if len(self._query_cache) > self._query_cache_size:
+                    self._query_cache.popitem(last=False)
+        
+        return list(formatted_results)
+    
+    async def astore_document(
+        self,
+        text: str,
+        summary: str,
+        facts: List[str],
+        questions: List[dict]
+    ) -> str:
+        """Store a processed document without blocking the event loop"""
+        return await asyncio.to_thread(self.store_document, text, summary, facts, questions)
+    
+    async def aquery(self, query_text: str, top_k: int = 5) -> List[Dict]:
+        """Query the memory without blocking the event loop"""
+        return await asyncio.to_thread(self.query, query_text, top_k)
+    
+    async def aget_stats(self) -> Dict:
+        """Get memory statistics without blocking the event loop"""
+        return await asyncio.to_thread(self.get_stats)
+    
+    async def aclear(self):
+        """Clear all memory without blocking the event loop"""
+        await asyncio.to_thread(self.clear)
     
     def get_stats(self) -> Dict:
         """Get memory statistics"""
@@ -113,16 +224,21 @@ class MemoryManager:
     def clear(self):
         """Clear all memory"""
         # Delete and recreate collection
+        self._sidecar.clear()
         self.client.delete_collection(name="document_memory")
         self.collection = self.client.get_or_create_collection(
             name="document_memory",
-            metadata={"description": "Stores processed documents with embeddings"}
+            metadata=COLLECTION_METADATA,
+            embedding_function=None
         )
+        self._invalidate_queries()
     
     def delete_document(self, doc_id: str):
         """Delete a specific document"""
         try:
             self.collection.delete(ids=[doc_id, f"{doc_id}_summary"])
+            self._sidecar.pop(doc_id, None)
+            self._invalidate_queries()
             return True
         except Exception as e:
             print(f"Error deleting document: {e}")
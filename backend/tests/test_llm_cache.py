@@ -0,0 +1,122 @@
+import asyncio
+
+from document_processor import DocumentProcessor
+from llm_cache import SemanticLLMCache
+from llm_handler import LLMHandler
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection that scores every prompt as identical
+
+    This is the worst case for near-duplicate prompts: any similarity lookup that is
+    allowed to run will hit.
+    """
+
+    def __init__(self):
+        self.rows = {}
+
+    def count(self):
+        return len(self.rows)
+
+    def upsert(self, documents, metadatas, ids):
+        for doc, metadata, row_id in zip(documents, metadatas, ids):
+            self.rows[row_id] = (doc, metadata)
+
+    def _matches(self, metadata, where):
+        for clause in where.get("$and", [where]):
+            for field, condition in clause.items():
+                if isinstance(condition, dict):
+                    if not metadata[field] < condition["$lt"]:
+                        return False
+                elif metadata[field] != condition:
+                    return False
+        return True
+
+    def query(self, query_texts, n_results, where):
+        hits = [
+            (row_id, metadata) for row_id, (_, metadata) in self.rows.items()
+            if self._matches(metadata, where)
+        ][:n_results]
+        return {
+            "ids": [[row_id for row_id, _ in hits]],
+            "metadatas": [[metadata for _, metadata in hits]],
+            "distances": [[0.0 for _ in hits]]
+        }
+
+    def delete(self, ids=None, where=None):
+        for row_id, (_, metadata) in list(self.rows.items()):
+            if (ids and row_id in ids) or (where and self._matches(metadata, where)):
+                del self.rows[row_id]
+
+
+class FakeClient:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, metadata=None, embedding_function=None):
+        return self.collections.setdefault(name, FakeCollection())
+
+    def delete_collection(self, name):
+        self.collections.pop(name, None)
+
+
+def make_handler():
+    handler = LLMHandler(cache=SemanticLLMCache(FakeClient(), embedding_function=None))
+    calls = []
+
+    async def fake_generate(prompt, config, temperature, max_tokens):
+        calls.append(prompt)
+        return f"completion #{len(calls)}"
+
+    handler._generate_openai_compatible = fake_generate
+    return handler, calls
+
+
+def test_near_duplicate_documents_do_not_share_summary():
+    handler, calls = make_handler()
+    processor = DocumentProcessor(handler)
+
+    first = asyncio.run(processor.summarize("Alice paid Bob $500 on March 3"))
+    second = asyncio.run(processor.summarize("Alice paid Bob $900 on March 5"))
+
+    assert len(calls) == 2
+    assert first != second
+
+
+def test_repeated_document_reuses_exact_match():
+    handler, calls = make_handler()
+    processor = DocumentProcessor(handler)
+
+    first = asyncio.run(processor.summarize("Alice paid Bob $500 on March 3"))
+    second = asyncio.run(processor.summarize("Alice paid Bob $500 on March 3"))
+
+    assert len(calls) == 1
+    assert first == second
+
+
+def test_similarity_tier_only_when_allowed():
+    cache = SemanticLLMCache(FakeClient(), embedding_function=None)
+    cache.set("groq", "m", 0.3, "What is 2 + 2?", "4")
+
+    assert cache.get("groq", "m", 0.3, "What is 2+2?") == "4"
+    assert cache.get("groq", "m", 0.3, "What is 2+2?", semantic=False) is None
+
+
+def test_set_prunes_expired_rows():
+    cache = SemanticLLMCache(FakeClient(), embedding_function=None, ttls={"groq": 60})
+    cache.set("groq", "m", 0.3, "old prompt", "old")
+    cache.collection.rows[next(iter(cache.collection.rows))][1]["ts"] -= 120
+
+    cache.set("groq", "m", 0.3, "new prompt", "new")
+
+    assert [doc for doc, _ in cache.collection.rows.values()] == ["new prompt"]
+
+
+def test_clear_drops_both_tiers():
+    cache = SemanticLLMCache(FakeClient(), embedding_function=None)
+    cache.set("groq", "m", 0.3, "prompt", "completion")
+
+    cache.clear()
+
+    assert cache.collection.count() == 0
+    assert cache.get("groq", "m", 0.3, "prompt") is None